@@ -25,116 +25,224 @@
 """A script for streaming a local or remote video file to Chromecast device."""
 
 import argparse
-from collections import namedtuple
-from datetime import timedelta
-from functools import partial
+from collections import deque, namedtuple
+from datetime import timezone
+import email.utils
+from functools import lru_cache, partial
 from http.server import BaseHTTPRequestHandler, HTTPStatus
+import io
 import logging
 import math
 import mimetypes
+import mmap
 import os
 import re
+import signal
+import socket
 import socketserver
 import sys
 import threading
 from threading import Event
 import time
+from typing import TYPE_CHECKING
 from urllib.parse import urljoin
 
-import pychromecast
-from pychromecast.controllers.media import MediaStatus, MediaStatusListener
+# Importing pychromecast is slow, so it is imported only when needed:
+if TYPE_CHECKING:
+    from pychromecast.controllers.media import MediaStatus
 
 
-class MyMediaStatusListener(
-    MediaStatusListener
-):  # pylint: disable=too-few-public-methods
+def format_time(seconds):
+    """Format time in seconds as H:MM:SS."""
+
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class MyMediaStatusListener:
     """Class that receives media status reports and emits status line to
-    terminal."""
+    terminal. Combined with MediaStatusListener from pychromecast in
+    play_video()."""
 
-    def new_media_status(self, status: MediaStatus):
+    def __init__(self, status_received):
+        self._status_received = status_received
+
+    def new_media_status(self, status: "MediaStatus"):
         if status.adjusted_current_time is not None:
-            current_time = str(
-                timedelta(seconds=math.floor(status.adjusted_current_time))
-            )
+            current_time = format_time(status.adjusted_current_time)
         else:
             current_time = "-:--:--"
 
         if status.duration is not None:
-            duration = str(timedelta(seconds=math.floor(status.duration)))
+            duration = format_time(status.duration)
         else:
             duration = "-:--:--"
 
         # Refresh status line on terminal:
-        print(
-            f"{current_time}/{duration} {status.player_state}                      \r",
-            end="",
+        sys.stdout.write(
+            f"{current_time}/{duration} {status.player_state}                      \r"
         )
+        sys.stdout.flush()
 
+        self._status_received.set()
 
-# Type for inventory entry of a local files that can be served:
-File = namedtuple("File", ["local_path", "size", "mimetype"])
+    def load_media_failed(self, queue_item_id, error_code):
+        """Report failure to load media."""
+
+        print(f"\nLoading media failed (error code: {error_code})")
+
+
+# Type for inventory entry of a local files that can be served. Includes
+# preformatted values for the most common response headers:
+File = namedtuple(
+    "File",
+    [
+        "local_path",
+        "size",
+        "mimetype",
+        "mtime",
+        "content_length",
+        "full_range",
+        "last_modified",
+    ],
+)
 
 # Regex for parsing "range" HTTP header value:
 BYTE_RANGE_RE = re.compile(r"bytes=(\d+)?-(\d+)?")
+_range_match = BYTE_RANGE_RE.fullmatch
 
 # Type for parsed "range" HTTP header value:
 Range = namedtuple("Range", ["first", "last"])
 
+# Value used when there is no (valid) "range" in the request:
+NO_RANGE = Range(first=None, last=None)
+
 
 class HTTPRequestHandler(BaseHTTPRequestHandler):
     """HTTP Request Handler class that serves local files to cast device.
     Supports range requests."""
 
+    # Use persistent connections so that the cast device does not need to
+    # reconnect for each range request:
+    protocol_version = "HTTP/1.1"
+
+    # Do not delay small writes such as response headers:
+    disable_nagle_algorithm = True
+
+    # Buffer size for copying file contents when sendfile is not available:
+    bufsize = 256 * 1024
+
+    # Size of the first chunk of file contents sent together with headers:
+    first_chunk_size = 128 * 1024
+
+    # Size of file regions mapped to memory at a time when sendfile is
+    # not available:
+    mmap_window = 64 * 1024 * 1024
+
+    # Seconds to wait for the next request on a persistent connection.
+    # Idle connections are closed so that they do not tie up workers:
+    idle_timeout = 30
+
     def __init__(self, *args, files, **kwargs):
         self._files = files
         self._file = None
-        self.range = Range(first=None, last=None)
+        self._persistent = False
+        self._held_headers = None
+        self.range = NO_RANGE
         super().__init__(*args, **kwargs)
 
+    def handle_one_request(self):
+        """Wait for the next request and handle it. Closes the connection
+        if no request arrives within idle timeout, or if the worker is
+        needed for another connection."""
+
+        if self._persistent:
+            # Let the server take the worker back while waiting:
+            if not self.server.connection_idle(self.connection):
+                self.close_connection = True
+                return
+
+        # The timeout is used only while waiting for the request. A socket
+        # with a timeout is non-blocking internally, which sendfile can not
+        # handle:
+        self.connection.settimeout(self.idle_timeout)
+        try:
+            self.rfile.peek(1)
+        except (socket.timeout, ConnectionResetError):
+            self.close_connection = True
+            return
+        finally:
+            self.connection.settimeout(None)
+            if self._persistent:
+                self.server.connection_busy(self.connection)
+
+        super().handle_one_request()
+        self._persistent = True
+
     def do_GET(self):  # pylint: disable=invalid-name
         """Handle HTTP GET request."""
 
         self.parse_range()
         try:
-            success = self.send_head()
-            if not success:
+            headers = self.send_head()
+            if headers is None:
                 return
 
             with open(self._file.local_path, "rb") as rfile:
-                self.copyfile(rfile, self.wfile)
+                self.copyfile(rfile, self.wfile, headers)
 
         except (ConnectionResetError, BrokenPipeError):
-            pass
+            self.close_connection = True
 
     def do_HEAD(self):  # pylint: disable=invalid-name
         """Handle HTTP HEAD request."""
 
+        self.parse_range()
         try:
-            self.send_head()
+            headers = self.send_head()
+            if headers is not None:
+                self.wfile.write(headers)
         except (ConnectionResetError, BrokenPipeError):
-            pass
+            self.close_connection = True
 
     def send_head(self):
-        """Check HTTP request and send response headers."""
+        """Check HTTP request and prepare response headers. Returns the
+        headers, or None if a complete response has already been sent."""
 
         # Check if the request path can be found in our "inventory":
         if self.path in self._files:
             self._file = self._files[self.path]
         else:
             self.send_error(HTTPStatus.NOT_FOUND, "File not found")
-            return False
+            return None
 
-        if self.range == Range(first=None, last=None):
+        last_modified = self._file.last_modified
+
+        if self.is_not_modified():
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header("Last-Modified", last_modified)
+            self.end_headers()
+            return None
+
+        # Ignore "range" if the file has changed since the client got
+        # the other parts of it:
+        if_range = self.headers.get("If-Range")
+        if if_range is not None and if_range != last_modified:
+            self.range = NO_RANGE
+
+        if self.range == NO_RANGE:
             # Normal HTTP request without "range":
             self.send_response(HTTPStatus.OK)
-            self.send_header("Content-Length", self._file.size)
+            self.send_header("Content-Length", self._file.content_length)
         else:
             # HTTP request for specific "range":
             last_pos = self._file.size - 1
 
             if self.range.first is None:  # handle "bytes=-N" case
+                # Serve the whole file if N is larger than the file:
                 self.range = Range(
-                    first=self._file.size - self.range.last, last=last_pos
+                    first=max(self._file.size - self.range.last, 0), last=last_pos
                 )
             elif self.range.last is None:  # handle "bytes=N-" case
                 self.range = Range(first=self.range.first, last=last_pos)
@@ -144,32 +252,89 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
                 or self.range.last > last_pos
                 or self.range.first > self.range.last
             ):  # Return 416 response code in case the range was bad:
-                self.send_error(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+                self.send_response(HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
                 self.send_header("Content-Range", f"bytes */{self._file.size}")
-                return False
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return None
 
             self.send_response(HTTPStatus.PARTIAL_CONTENT)
-            self.send_header(
-                "Content-Length", str(self.range.last - self.range.first + 1)
-            )
-            self.send_header(
-                "Content-Range",
-                f"bytes {self.range.first}-{self.range.last}/{self._file.size}",
-            )
+            if self.range == (0, last_pos):
+                # Range covering the whole file is the most common one:
+                self.send_header("Content-Length", self._file.content_length)
+                self.send_header("Content-Range", self._file.full_range)
+            else:
+                self.send_header(
+                    "Content-Length", str(self.range.last - self.range.first + 1)
+                )
+                self.send_header(
+                    "Content-Range",
+                    f"bytes {self.range.first}-{self.range.last}/{self._file.size}",
+                )
 
         self.send_header("Content-Type", self._file.mimetype)
+        self.send_header("Last-Modified", last_modified)
         self.send_header("Accept-Ranges", "bytes")
-        self.send_header("Access-Control-Allow-Origin", "*")
-        self.end_headers()
-        return True
+
+        # Only cross-origin requests (such as the cast device fetching
+        # subtitles) need CORS, plain media requests do not have "Origin":
+        if "Origin" in self.headers:
+            self.send_header("Access-Control-Allow-Origin", "*")
+
+        # Hold the headers back instead of writing them out, so that they
+        # can be sent together with the first chunk of the response body:
+        self._held_headers = b""
+        try:
+            self.end_headers()
+            return self._held_headers
+        finally:
+            self._held_headers = None
+
+    def flush_headers(self):
+        """Write out buffered headers, or capture them if they are being
+        held back by send_head()."""
+
+        if self._held_headers is None:
+            super().flush_headers()
+            return
+
+        wfile, self.wfile = self.wfile, io.BytesIO()
+        try:
+            super().flush_headers()
+            self._held_headers += self.wfile.getvalue()
+        finally:
+            self.wfile = wfile
+
+    def is_not_modified(self):
+        """Check if the file has not been modified since the time given
+        in "If-Modified-Since" header."""
+
+        header = self.headers.get("If-Modified-Since")
+        if header is None:
+            return False
+
+        try:
+            since = email.utils.parsedate_to_datetime(header)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            return False
+
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+        return math.floor(self._file.mtime) <= since.timestamp()
 
     def parse_range(self):
         """Parse range header. Supports only a single range."""
 
-        if not "Range" in self.headers:
+        # The same handler instance may serve several requests on a
+        # persistent connection:
+        self.range = NO_RANGE
+
+        header = self.headers.get("Range")
+        if header is None:
             return
 
-        match = BYTE_RANGE_RE.fullmatch(self.headers["Range"])
+        match = _range_match(header)
         if not match:
             return
 
@@ -180,8 +345,9 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
 
         self.range = Range(first=first, last=last)
 
-    def copyfile(self, rfile, wfile, bufsize=64 * 1024):
-        """Copy file contents (all or range) from rfile to wfile."""
+    def copyfile(self, rfile, wfile, headers=b""):
+        """Send headers and copy file contents (all or range) from rfile
+        to wfile."""
 
         first, last = self.range
 
@@ -191,19 +357,134 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         if last is None:
             last = self._file.size - 1
 
+        offset = first
         remaining = last - first + 1
 
-        if first > 0:
-            rfile.seek(first)
+        fadvise = hasattr(os, "posix_fadvise")
+        if fadvise:
+            # Tell the kernel that the file is read sequentially and
+            # that the requested range is needed soon:
+            os.posix_fadvise(rfile.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            os.posix_fadvise(rfile.fileno(), offset, remaining, os.POSIX_FADV_WILLNEED)
+
+        try:
+            if hasattr(os, "pread") and hasattr(self.connection, "sendmsg"):
+                # Send headers and the first chunk of the file together
+                # in a single system call:
+                chunk = os.pread(
+                    rfile.fileno(), min(remaining, self.first_chunk_size), offset
+                )
+                self.sendmsg_all([headers, chunk])
+                offset += len(chunk)
+                remaining -= len(chunk)
+            else:
+                wfile.write(headers)
+
+            if hasattr(os, "sendfile"):
+                # Use zero-copy sendfile(2) to move the data directly from
+                # the page cache to the socket:
+                try:
+                    while remaining > 0:
+                        sent = os.sendfile(
+                            wfile.fileno(), rfile.fileno(), offset, remaining
+                        )
+                        if sent == 0:
+                            # File got shorter while running? We can not
+                            # honor Content-Length, so close the connection:
+                            self.close_connection = True
+                            return
+
+                        offset += sent
+                        remaining -= sent
+                    return
+                except BlockingIOError:
+                    # Fall back to copying the rest via user space:
+                    pass
+
+            for size in self.copy_mapped(rfile, wfile, offset, remaining):
+                offset += size
+                remaining -= size
+
+            if remaining == 0:
+                return
+
+            # Use positional reads if available, so there is no need to seek:
+            preadv = hasattr(os, "preadv")
+            if not preadv and offset > 0:
+                rfile.seek(offset)
+
+            # Reuse the same buffer for each chunk:
+            buf = memoryview(bytearray(self.bufsize))
+
+            while remaining > 0:
+                chunk = buf[: min(remaining, self.bufsize)]
+                if preadv:
+                    size = os.preadv(rfile.fileno(), [chunk], offset)
+                else:
+                    size = rfile.readinto(chunk)
+
+                if not size:
+                    # File got shorter while running?
+                    self.close_connection = True
+                    break
+
+                wfile.write(buf[:size])
+                offset += size
+                remaining -= size
+
+        finally:
+            if fadvise and offset > first:
+                # Drop the already sent part of the range from the page cache
+                # so that streaming a large video does not evict everything
+                # else:
+                os.posix_fadvise(
+                    rfile.fileno(), first, offset - first, os.POSIX_FADV_DONTNEED
+                )
+
+    def copy_mapped(self, rfile, wfile, offset, remaining):
+        """Copy a range of rfile to wfile directly from memory mappings of
+        the file, one window at a time. Yields the number of bytes sent for
+        each chunk. Stops early if the file can not be mapped."""
 
         while remaining > 0:
-            buf = rfile.read(min(remaining, bufsize))
-            if buf == "":
-                # File got shorter while running?
-                break
+            # The mapping must start at a multiple of allocation granularity:
+            skew = offset % mmap.ALLOCATIONGRANULARITY
+            end = skew + min(remaining, self.mmap_window)
+
+            try:
+                mapped = mmap.mmap(
+                    rfile.fileno(), end, offset=offset - skew, access=mmap.ACCESS_READ
+                )
+            except (OSError, ValueError, OverflowError):
+                # File got shorter while running or can not be mapped?
+                return
+
+            with mapped, memoryview(mapped) as view:
+                if hasattr(mmap, "MADV_SEQUENTIAL"):
+                    mapped.madvise(mmap.MADV_SEQUENTIAL)
 
-            wfile.write(buf)
-            remaining -= len(buf)
+                for pos in range(skew, end, self.bufsize):
+                    size = min(self.bufsize, end - pos)
+                    with view[pos : pos + size] as chunk:
+                        wfile.write(chunk)
+
+                    offset += size
+                    remaining -= size
+                    yield size
+
+    def sendmsg_all(self, buffers):
+        """Send all data from a list of buffers using scatter-gather I/O."""
+
+        buffers = [memoryview(buf) for buf in buffers if buf]
+
+        while buffers:
+            sent = self.connection.sendmsg(buffers)
+            while sent:
+                if sent >= len(buffers[0]):
+                    sent -= len(buffers.pop(0))
+                else:
+                    buffers[0] = buffers[0][sent:]
+                    sent = 0
 
     def log_request(self, code="-", size="-"):
         """Override log_request function to suppress log output."""
@@ -211,27 +492,151 @@ class HTTPRequestHandler(BaseHTTPRequestHandler):
         return
 
 
-def start_httpd(server_address, files):
+class HTTPServer(socketserver.TCPServer):
+    """HTTP server for serving local files to cast device. Uses a fixed
+    pool of worker threads so that we can serve multiple HTTP requests
+    simultaneously."""
+
+    allow_reuse_address = True
+
+    # Seconds to wait for responses in progress when the server is closed:
+    close_timeout = 10
+
+    def __init__(self, *args, sndbuf=None, max_workers=8, **kwargs):
+        if max_workers < 1:
+            raise ValueError("max_workers must be at least 1")
+
+        self.sndbuf = sndbuf
+        self._pending = deque()
+        self._connections = set()
+        self._idle_connections = set()
+        self._waiting_workers = 0
+        self._condition = threading.Condition()
+        self._closing = False
+        # Set before binding, server_close() is called if binding fails:
+        self._workers = []
+        super().__init__(*args, **kwargs)
+
+        # Use daemon threads so that a stuck connection can not prevent
+        # the program from exiting:
+        for i in range(max_workers):
+            worker = threading.Thread(
+                target=self.process_requests, name=f"ccast-httpd-{i}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def server_bind(self):
+        """Set socket options and bind the server socket."""
+
+        # Accepted sockets inherit the send buffer size from the
+        # listening socket:
+        if self.sndbuf:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.sndbuf)
+
+        super().server_bind()
+
+    def process_request(self, request, client_address):
+        """Queue request for the worker threads. If all workers are busy,
+        close idle persistent connections to free workers for it."""
+
+        with self._condition:
+            self._pending.append((request, client_address))
+            self._condition.notify()
+
+            while len(self._pending) > self._waiting_workers and self._idle_connections:
+                self.stop_reading(self._idle_connections.pop())
+
+    def process_requests(self):
+        """Handle queued requests. Run by each worker thread."""
+
+        while True:
+            with self._condition:
+                self._waiting_workers += 1
+                while not self._pending and not self._closing:
+                    self._condition.wait()
+                self._waiting_workers -= 1
+
+                if not self._pending:
+                    # Server was closed
+                    return
+
+                request, client_address = self._pending.popleft()
+                self._connections.add(request)
+                if self._closing:
+                    self.stop_reading(request)
+
+            try:
+                self.finish_request(request, client_address)
+            except Exception:  # pylint: disable=broad-exception-caught
+                self.handle_error(request, client_address)
+            finally:
+                with self._condition:
+                    self._connections.discard(request)
+                    self._idle_connections.discard(request)
+                self.shutdown_request(request)
+
+    def connection_idle(self, request):
+        """Mark a persistent connection as waiting for its next request.
+        Returns False if it should be closed instead, because there are
+        queued requests without a free worker."""
+
+        with self._condition:
+            if len(self._pending) > self._waiting_workers or self._closing:
+                return False
+
+            self._idle_connections.add(request)
+            return True
+
+    def connection_busy(self, request):
+        """Mark a persistent connection as no longer waiting."""
+
+        with self._condition:
+            self._idle_connections.discard(request)
+
+    @staticmethod
+    def stop_reading(request):
+        """Stop reading further requests from a connection. A connection
+        waiting for a request gets closed, while a response in progress is
+        still completed."""
+
+        try:
+            request.shutdown(socket.SHUT_RD)
+        except OSError:
+            pass
+
+    def server_close(self):
+        """Close the server socket and wait (up to close timeout) for the
+        worker threads to complete the responses in progress."""
+
+        super().server_close()
+
+        with self._condition:
+            self._closing = True
+            for request in self._connections:
+                self.stop_reading(request)
+            self._condition.notify_all()
+
+        deadline = time.monotonic() + self.close_timeout
+        for worker in self._workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+
+def start_httpd(server_address, files, sndbuf=None, max_workers=8):
     """Start HTTP server for serving local files."""
 
     # Use "partial" from "functools" to pass local file directory
     # to the request handler:
     handler = partial(HTTPRequestHandler, files=files)
 
-    # Use a threading server variant so that we can serve multiple
-    # HTTP requests simultaneously:
-    httpd = socketserver.ThreadingTCPServer(
-        server_address, handler, bind_and_activate=False
-    )
-    httpd.allow_reuse_address = True
-    httpd.daemon_threads = True
-    httpd.server_bind()
-    httpd.server_activate()
+    httpd = HTTPServer(server_address, handler, sndbuf=sndbuf, max_workers=max_workers)
 
     # Start the HTTP server in a daemon thread:
     httpd_thread = threading.Thread(target=httpd.serve_forever, daemon=True)
     httpd_thread.start()
 
+    return httpd, httpd_thread
+
 
 def play_video(
     cast,
@@ -241,13 +646,22 @@ def play_video(
     subs_mimetype=None,
     wait_timeout=10,
     idle_timeout=10,
+    stop_requested=None,
 ):  # pylint: disable=too-many-arguments
-    """Play video on cast device and display status in terminal."""
+    """Play video on cast device and display status in terminal. Playback
+    is stopped early if stop_requested event is set."""
+
+    # pylint: disable=import-outside-toplevel
+    from pychromecast.controllers.media import MediaStatusListener
+
+    class StatusListener(MyMediaStatusListener, MediaStatusListener):
+        """Media status listener that emits status line to terminal."""
 
     media_controller = cast.media_controller
 
     # Register a status listener that emits a status line on the terminal:
-    media_status_listener = MyMediaStatusListener()
+    status_received = Event()
+    media_status_listener = StatusListener(status_received)
     media_controller.register_status_listener(media_status_listener)
 
     # Start playback:
@@ -259,32 +673,30 @@ def play_video(
     )
     media_controller.block_until_active(timeout=wait_timeout)
 
-    try:
-        idle_since = None
+    if stop_requested is None:
+        stop_requested = Event()
 
-        while True:
-            # Get status update from the cast device every second.
-            # As a side effect this will cause a status line refresh
-            # to be emitted to terminal.
-            media_controller.update_status()
-
-            if media_controller.status.player_is_idle:
-                if idle_since is None:
-                    idle_since = time.monotonic()
-                else:
-                    if time.monotonic() - idle_since > idle_timeout:
-                        # Bail out if the player has been idle for 10 seconds.
-                        # The video probably ended.
-                        break
+    idle_since = None
 
-            else:
-                idle_since = None
+    while not stop_requested.is_set():
+        # Status updates are pushed by the cast device. Wait for one,
+        # but refresh the status line every second anyway so that
+        # the playback position keeps advancing on the terminal:
+        if not status_received.wait(timeout=1):
+            media_status_listener.new_media_status(media_controller.status)
+        status_received.clear()
 
-            time.sleep(1)
+        if media_controller.status.player_is_idle:
+            if idle_since is None:
+                idle_since = time.monotonic()
+            else:
+                if time.monotonic() - idle_since > idle_timeout:
+                    # Bail out if the player has been idle for 10 seconds.
+                    # The video probably ended.
+                    break
 
-    except KeyboardInterrupt:
-        # Pressing ctrl-C stops playback.
-        pass
+        else:
+            idle_since = None
 
     print("\nExiting")
     media_controller.stop()
@@ -292,13 +704,20 @@ def play_video(
     cast.quit_app()
 
 
+@lru_cache(maxsize=32)
+def guess_mimetype(extension):
+    """Guess mimetype from file name extension."""
+
+    return mimetypes.guess_type(f"file{extension}")[0]
+
+
 def prepare_source(source, mimetype, local_ip, local_port, url_path):
     """Prepare source file or URL for streaming."""
 
     if mimetype is None:
-        mimetype = mimetypes.guess_type(source)[0]
+        mimetype = guess_mimetype(os.path.splitext(source)[1].lower())
 
-    if source.startswith("http://") or source.startswith("https://"):
+    if source.startswith(("http://", "https://")):
         # Remote URL
         url = source
         local_files = {}
@@ -306,19 +725,27 @@ def prepare_source(source, mimetype, local_ip, local_port, url_path):
         # Local file
         url = urljoin(f"http://{local_ip}:{local_port}/", url_path)
 
+        stat = os.stat(source)
+        size = stat.st_size
         local_files = {
             url_path: File(
                 local_path=source,
-                size=os.path.getsize(source),
+                size=size,
                 mimetype=mimetype,
+                mtime=stat.st_mtime,
+                content_length=str(size),
+                full_range=f"bytes 0-{size - 1}/{size}",
+                last_modified=email.utils.formatdate(stat.st_mtime, usegmt=True),
             )
         }
 
     return url, mimetype, local_files
 
 
-def handle_args():
-    """Handle command-line arguments."""
+@lru_cache(maxsize=None)
+def make_parser():
+    """Create command-line argument parser. The parser is created only
+    once and reused on subsequent calls."""
 
     parser = argparse.ArgumentParser()
     parser.add_argument("video_source", help="video source (local file or URL)")
@@ -357,6 +784,17 @@ def handle_args():
         help="Local port for serving video (default: 8080)",
         default=8080,
     )
+    parser.add_argument(
+        "--tcp-sndbuf",
+        type=int,
+        help="TCP send buffer size in bytes for serving video (default: system)",
+    )
+    parser.add_argument(
+        "--max-workers",
+        type=int,
+        help="Maximum number of simultaneous HTTP requests served (default: 8)",
+        default=8,
+    )
     parser.add_argument(
         "--video-mimetype", help="Video source mimetype (default: autodetect)"
     )
@@ -365,8 +803,18 @@ def handle_args():
         "--subs-mimetype", help="Subtitles source mimetype (default: autodetect)"
     )
     parser.add_argument("--debug", help="Enable debug output", action="store_true")
+    return parser
+
+
+def handle_args():
+    """Handle command-line arguments."""
+
+    parser = make_parser()
     args = parser.parse_args()
 
+    if args.max_workers < 1:
+        parser.error("--max-workers must be at least 1")
+
     if args.debug:
         logging.basicConfig(level=logging.DEBUG)
 
@@ -376,6 +824,8 @@ def handle_args():
 def discover_cast(args):
     """Discover and/or select cast device."""
 
+    import pychromecast  # pylint: disable=import-outside-toplevel
+
     if args.chromecast_name:
         # Find a named cast device:
         chromecasts = pychromecast.get_listed_chromecasts(
@@ -454,13 +904,29 @@ def main():
 
     # Start local HTTP server in case we need to serve local files
     # to the cast device:
+    httpd = None
     if local_files:
-        start_httpd((args.local_ip, args.local_port), local_files)
+        httpd, httpd_thread = start_httpd(
+            (args.local_ip, args.local_port),
+            local_files,
+            sndbuf=args.tcp_sndbuf,
+            max_workers=args.max_workers,
+        )
 
     print(f"Video URL: {video_url} ({video_mimetype})")
     if subs_url:
         print(f"Subtitles URL: {subs_url} ({subs_mimetype})")
 
+    # Pressing ctrl-C stops playback. Pressing it again terminates
+    # immediately in case stopping gets stuck:
+    stop_requested = Event()
+
+    def request_stop(*_):
+        stop_requested.set()
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+
+    signal.signal(signal.SIGINT, request_stop)
+
     # Video playback:
     play_video(
         cast,
@@ -470,8 +936,16 @@ def main():
         subs_mimetype=subs_mimetype,
         wait_timeout=args.wait_timeout,
         idle_timeout=args.idle_timeout,
+        stop_requested=stop_requested,
     )
 
+    # Stop the HTTP server only after playback has been stopped so that
+    # the cast device is not left with broken connections:
+    if httpd is not None:
+        httpd.shutdown()
+        httpd.server_close()
+        httpd_thread.join()
+
     cast.disconnect(timeout=args.wait_timeout)
 
 